@@ -22,9 +22,26 @@ class Settings:
         self.debug: bool = os.getenv("DEBUG", "False").lower() == "true"
 
         # API Settings
+        self.openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
         self.default_openai_model: str = os.getenv("DEFAULT_OPENAI_MODEL", "gpt-4-1106-preview")
         self.max_news_articles: int = int(os.getenv("MAX_NEWS_ARTICLES", "5"))
         self.default_language: str = os.getenv("DEFAULT_LANGUAGE", "en")
+        self.max_stored_posts: int = int(os.getenv("MAX_STORED_POSTS", "100"))
+
+        # Response settings
+        self.compression_min_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+        # Admission control settings
+        self.max_concurrent_generations: int = int(os.getenv("MAX_CONCURRENT_GENERATIONS", "4"))
+        self.generation_queue_size: int = int(os.getenv("GENERATION_QUEUE_SIZE", "16"))
+        self.generation_queue_timeout: float = float(os.getenv("GENERATION_QUEUE_TIMEOUT", "30"))
+        self.generation_latency_target: float = float(os.getenv("GENERATION_LATENCY_TARGET", "60"))
+        self.client_requests_per_minute: int = int(os.getenv("CLIENT_REQUESTS_PER_MINUTE", "10"))
+        self.client_burst: int = int(os.getenv("CLIENT_BURST", "5"))
+        self.trusted_proxy_hops: int = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+        self.api_keys: list[str] = [
+            key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()
+        ]
 
         # Вывод отладочной информации
         print("🔧 Configuration loaded:")
@@ -1,17 +1,74 @@
-from fastapi import FastAPI
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
 import uvicorn
 from app.config import settings
+from app.middleware import AdmissionController, AdmissionControlMiddleware, CompressionMiddleware
+from app.models.schemas import TopicRequest, StoredPostResponse, PostListResponse, HealthCheckResponse
+from app.responses import conditional_response
+from app.services.currents_service import CurrentsAPI
+from app.services.openai_service import OpenAIContentGenerator
+from app.services.post_storage import PostStorage
 from app.services.telegram_service import TelegramService
 
-app = FastAPI()
+# orjson заметно быстрее стандартного JSON-кодировщика на больших постах
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+
+# Контроль допуска: ограничение параллельных генераций и квоты клиентов
+admission_controller = AdmissionController(
+    max_concurrent=settings.max_concurrent_generations,
+    max_queue=settings.generation_queue_size,
+    queue_timeout=settings.generation_queue_timeout,
+    latency_target=settings.generation_latency_target,
+    client_rate=settings.client_requests_per_minute / 60,
+    client_burst=settings.client_burst
+)
+app.add_middleware(
+    AdmissionControlMiddleware,
+    controller=admission_controller,
+    api_keys=settings.api_keys,
+    trusted_proxy_hops=settings.trusted_proxy_hops
+)
 
 # Инициализация Telegram сервиса
 telegram_service = TelegramService(settings.telegram_bot_token, settings.telegram_chat_id)
 
+# Инициализация сервисов генерации и хранения постов
+currents_api = CurrentsAPI(settings.currents_api_key)
+# Таймауты OpenAI ограничены целевой задержкой, чтобы зависший запрос
+# не удерживал слот генерации дольше, чем рассчитывает контроль допуска
+content_generator = OpenAIContentGenerator(
+    settings.openai_api_key,
+    total_timeout=settings.generation_latency_target,
+    max_retries=settings.openai_max_retries
+)
+post_storage = PostStorage(settings.max_stored_posts)
+
 @app.get("/")
 def root():
     return {"message": "With TelegramService - WORKS"}
 
+@app.get("/health", response_model=HealthCheckResponse)
+def health():
+    """Проверка здоровья сервиса с учетом перегрузки"""
+    overloaded = admission_controller.is_overloaded()
+    return HealthCheckResponse(
+        status="degraded" if overloaded else "healthy",
+        timestamp=datetime.now(),
+        services={
+            "openai": "configured" if settings.openai_api_key else "not_configured",
+            "currents": "configured" if settings.currents_api_key else "not_configured",
+            "telegram": "configured" if settings.telegram_bot_token else "not_configured",
+            "admission": "overloaded" if overloaded else "ok"
+        }
+    )
+
+@app.get("/metrics")
+def metrics():
+    """Метрики контроля допуска запросов на генерацию"""
+    return {"admission": admission_controller.get_stats()}
+
 @app.get("/telegram-test")
 async def telegram_test():
     try:
@@ -35,4 +92,40 @@ async def send_test_message():
         )
         return {"status": "success", "result": result}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
+
+
+@app.post("/generate-post", response_model=StoredPostResponse)
+def generate_post(request: TopicRequest):
+    """Генерация поста по теме с сохранением результата"""
+    news_articles = []
+    if request.include_news:
+        news_articles = currents_api.get_latest_news(
+            keywords=request.topic,
+            language=request.language,
+            max_results=request.max_news_articles
+        )
+
+    post = content_generator.generate_blog_post(
+        topic=request.topic,
+        news_articles=news_articles,
+        writing_style=request.writing_style
+    )
+    return post_storage.add_post(post)
+
+@app.get("/posts", response_model=PostListResponse)
+def list_posts(request: Request):
+    """Список сохраненных постов (поддерживает If-None-Match)"""
+    posts = post_storage.list_posts()
+    return conditional_response(request, PostListResponse(posts=posts, total=len(posts)))
+
+@app.get("/posts/{post_id}", response_model=StoredPostResponse)
+def get_post(post_id: str, request: Request):
+    """Получение сохраненного поста (поддерживает If-None-Match)"""
+    post = post_storage.get_post(post_id)
+    if post is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пост не найден"
+        )
+    return conditional_response(request, post)
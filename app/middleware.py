@@ -0,0 +1,424 @@
+import asyncio
+import gzip
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, FrozenSet, Iterable, Optional, Tuple
+
+import brotli
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware для сжатия ответов (brotli/gzip)
+
+    Кодировка выбирается по заголовку Accept-Encoding с учетом q-значений.
+    Ответы меньше minimum_size отдаются без сжатия. Vary: Accept-Encoding
+    добавляется ко всем ответам, так как сжатое и несжатое представления
+    имеют общий слабый ETag.
+    """
+
+    # При равных q-значениях предпочитаем brotli
+    supported_encodings = ("br", "gzip")
+
+    def __init__(self,
+                 app: ASGIApp,
+                 minimum_size: int = 1024,
+                 gzip_level: int = 6,
+                 brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def select_encoding(self, accept_encoding: str) -> Optional[str]:
+        """Выбор кодировки сжатия по заголовку Accept-Encoding"""
+        weights = {}
+        for item in accept_encoding.split(","):
+            coding, _, params = item.strip().partition(";")
+            coding = coding.strip().lower()
+            if not coding:
+                continue
+
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            weights[coding] = quality
+
+        best, best_quality = None, 0.0
+        for coding in self.supported_encodings:
+            quality = weights.get(coding, weights.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        return best
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        """Сжатие тела ответа выбранной кодировкой"""
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+
+class _CompressionResponder:
+    """Обертка над send, сжимающая тело одиночного (не потокового) ответа"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str], send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream_send = send
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self.downstream_send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            _add_vary_accept_encoding(MutableHeaders(raw=message.setdefault("headers", [])))
+            if self.encoding is None:
+                self.passthrough = True
+                await self.downstream_send(message)
+                return
+            # Заголовки откладываем до получения тела
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.start_message is None:
+            await self.downstream_send(message)
+            return
+
+        start_message, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=start_message["headers"])
+        body = message.get("body", b"")
+
+        # Потоковые и уже сжатые ответы, а также ответы без тела отдаем как есть
+        if (message.get("more_body", False)
+                or "content-encoding" in headers
+                or start_message["status"] in (204, 304)
+                or len(body) < self.middleware.minimum_size):
+            self.passthrough = True
+            await self.downstream_send(start_message)
+            await self.downstream_send(message)
+            return
+
+        compressed = self.middleware.compress(body, self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+
+        await self.downstream_send(start_message)
+        await self.downstream_send({"type": "http.response.body", "body": compressed})
+
+
+def _add_vary_accept_encoding(headers: MutableHeaders) -> None:
+    """Добавление Accept-Encoding в Vary без дублирования"""
+    vary = [item.strip().lower() for item in headers.get("vary", "").split(",")]
+    if "accept-encoding" not in vary and "*" not in vary:
+        headers.add_vary_header("Accept-Encoding")
+
+
+class AdmissionRejected(Exception):
+    """Запрос отклонен контролем допуска"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Контроль допуска запросов на генерацию
+
+    Ограничивает число одновременных генераций, держит ограниченную очередь
+    ожидания с дедлайном и заранее отклоняет запросы, если ожидаемое время
+    в очереди превышает целевую задержку. Дополнительно для каждого клиента
+    действует квота по алгоритму token bucket.
+    """
+
+    # Сколько секунд после последнего отказа сервис считается перегруженным
+    overload_window = 10.0
+    # Лимит числа отслеживаемых клиентов, сверх которого вытесняются давно неактивные
+    max_tracked_clients = 10000
+
+    def __init__(self,
+                 max_concurrent: int = 4,
+                 max_queue: int = 16,
+                 queue_timeout: float = 30.0,
+                 latency_target: float = 60.0,
+                 client_rate: float = 10 / 60,
+                 client_burst: int = 5,
+                 initial_service_time: float = 15.0):
+        # Нулевые значения приводят к делению на ноль в оценках ожидания и квотах
+        if max_concurrent <= 0:
+            raise ValueError("max_concurrent (MAX_CONCURRENT_GENERATIONS) должен быть больше 0")
+        if max_queue < 0:
+            raise ValueError("max_queue (GENERATION_QUEUE_SIZE) не может быть отрицательным")
+        if queue_timeout <= 0 or latency_target <= 0:
+            raise ValueError("queue_timeout и latency_target должны быть больше 0")
+        if client_rate <= 0:
+            raise ValueError("client_rate (CLIENT_REQUESTS_PER_MINUTE) должен быть больше 0")
+        if client_burst < 1:
+            raise ValueError("client_burst (CLIENT_BURST) должен быть не меньше 1")
+
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        # Скользящее среднее времени генерации (EWMA)
+        self._service_time = initial_service_time
+        self._last_rejected_at: Optional[float] = None
+        self._counters = {
+            "admitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected_overload": 0,
+            "rejected_quota": 0,
+            "queue_timeouts": 0,
+        }
+
+    def estimated_wait(self) -> float:
+        """Оценка времени ожидания для нового запроса в очереди"""
+        return (len(self._waiters) + 1) / self.max_concurrent * self._service_time
+
+    def check_quota(self, client_id: str) -> None:
+        """Списание токена из корзины клиента"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(client_id, (float(self.client_burst), now))
+        tokens = min(float(self.client_burst), tokens + (now - updated_at) * self.client_rate)
+
+        self._buckets.pop(client_id, None)
+        if tokens < 1.0:
+            self._buckets[client_id] = (tokens, now)
+            # Исчерпанная квота одного клиента не считается перегрузкой сервиса
+            self._counters["rejected_quota"] += 1
+            raise AdmissionRejected(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Превышена квота запросов для клиента",
+                (1.0 - tokens) / self.client_rate
+            )
+
+        self._buckets[client_id] = (tokens - 1.0, now)
+        # Корзины упорядочены по последнему обращению, вытеснение за O(1)
+        while len(self._buckets) > self.max_tracked_clients:
+            self._buckets.popitem(last=False)
+
+    def refund_quota(self, client_id: str) -> None:
+        """Возврат токена клиенту, если запрос отклонен из-за перегрузки"""
+        if client_id in self._buckets:
+            tokens, updated_at = self._buckets[client_id]
+            self._buckets[client_id] = (min(float(self.client_burst), tokens + 1.0), updated_at)
+
+    async def acquire(self) -> None:
+        """Получение слота на генерацию (с ожиданием в очереди)"""
+        if self._in_flight < self.max_concurrent and not self._waiters:
+            self._admit()
+            return
+
+        # Запрос, который не дождется слота до дедлайна очереди, отклоняем сразу
+        estimated_wait = self.estimated_wait()
+        wait_limit = min(self.latency_target, self.queue_timeout)
+        if len(self._waiters) >= self.max_queue or estimated_wait > wait_limit:
+            self._reject("rejected_overload")
+            raise AdmissionRejected(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "Сервис перегружен, попробуйте позже",
+                estimated_wait
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except BaseException:
+            # Клиент отключился: возвращаем слот, если он уже был передан
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._drop_waiter(waiter)
+            raise
+
+        if not waiter.done():
+            self._drop_waiter(waiter)
+            self._reject("queue_timeouts")
+            raise AdmissionRejected(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "Превышено время ожидания в очереди",
+                self.estimated_wait()
+            )
+
+        self._counters["admitted"] += 1
+
+    def release(self, service_time: Optional[float] = None, succeeded: bool = True) -> None:
+        """
+        Освобождение слота и передача его первому ожидающему
+
+        Args:
+            service_time: Длительность обработки запроса
+            succeeded: Успешен ли ответ; быстрые ошибки не учитываются
+                в среднем времени генерации, иначе оценка ожидания занижается
+        """
+        if service_time is not None:
+            if succeeded:
+                self._counters["completed"] += 1
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            else:
+                self._counters["failed"] += 1
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Слот переходит ожидающему, счетчик in_flight не меняется
+                waiter.set_result(None)
+                return
+
+        self._in_flight -= 1
+
+    def is_overloaded(self) -> bool:
+        """Признак перегрузки для health-check"""
+        # При max_queue=0 очереди нет вовсе, и пустая "очередь" не означает перегрузку
+        if self.max_queue > 0 and len(self._waiters) >= self.max_queue:
+            return True
+        return (self._last_rejected_at is not None
+                and time.monotonic() - self._last_rejected_at < self.overload_window)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Текущее состояние контроля допуска"""
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "avg_service_time": round(self._service_time, 3),
+            "estimated_wait": round(self.estimated_wait(), 3),
+            "overloaded": self.is_overloaded(),
+            **self._counters,
+        }
+
+    def _admit(self) -> None:
+        self._in_flight += 1
+        self._counters["admitted"] += 1
+
+    def _reject(self, counter: str) -> None:
+        self._counters[counter] += 1
+        self._last_rejected_at = time.monotonic()
+
+    def _drop_waiter(self, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware, пропускающее запросы на генерацию через AdmissionController
+
+    Учитываются только POST-запросы на пути из paths (точное совпадение).
+    Клиент определяется по заголовку X-API-Key, если ключ входит в api_keys,
+    иначе по IP-адресу клиента. За trusted_proxy_hops доверенными прокси
+    адрес берется из X-Forwarded-For: N-я запись справа добавлена ближайшим
+    к клиенту доверенным прокси, а все записи левее подделываются клиентом.
+    Отклоненные запросы получают 429/503 с заголовком Retry-After.
+    """
+
+    def __init__(self,
+                 app: ASGIApp,
+                 controller: AdmissionController,
+                 api_keys: Iterable[str] = (),
+                 trusted_proxy_hops: int = 0,
+                 paths: Tuple[str, ...] = ("/generate-post",)):
+        if trusted_proxy_hops < 0:
+            raise ValueError("trusted_proxy_hops не может быть отрицательным")
+        self.app = app
+        self.controller = controller
+        self.api_keys: FrozenSet[str] = frozenset(api_keys)
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (scope["type"] != "http"
+                or scope["method"] != "POST"
+                or scope["path"] not in self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        client_id = self.get_client_id(scope)
+        try:
+            self.controller.check_quota(client_id)
+            try:
+                await self.controller.acquire()
+            except AdmissionRejected:
+                # Отказ по перегрузке не должен расходовать квоту клиента,
+                # иначе повтор по Retry-After может получить 429
+                self.controller.refund_quota(client_id)
+                raise
+        except AdmissionRejected as e:
+            logger.warning(f"Запрос отклонен ({e.status_code}): {e.detail}")
+            response = ORJSONResponse(
+                status_code=e.status_code,
+                content={"detail": e.detail},
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.monotonic()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.controller.release(time.monotonic() - started_at, succeeded=status_code < 400)
+
+    def get_client_id(self, scope: Scope) -> str:
+        """Идентификатор клиента для квот"""
+        # Непроверенный ключ позволил бы обходить квоту, меняя его в каждом запросе
+        headers = Headers(scope=scope)
+        api_key = headers.get("x-api-key")
+        if api_key and api_key in self.api_keys:
+            return f"key:{api_key}"
+
+        if self.trusted_proxy_hops:
+            hops = [hop.strip() for hop in ",".join(headers.getlist("x-forwarded-for")).split(",")]
+            hops = [hop for hop in hops if hop]
+            # Запрос в обход прокси: заголовку доверять нельзя, учитываем по адресу соединения
+            if len(hops) >= self.trusted_proxy_hops:
+                return f"ip:{hops[-self.trusted_proxy_hops]}"
+
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "ip:unknown"
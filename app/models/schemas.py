@@ -77,6 +77,15 @@ class GeneratedPostResponse(BaseModel):
     tokens_used: int = Field(..., description="Использованные токены")
     writing_style: str = Field(..., description="Стиль написания")
 
+class StoredPostResponse(GeneratedPostResponse):
+    """Модель сохраненного поста"""
+    post_id: str = Field(..., description="Идентификатор поста")
+
+class PostListResponse(BaseModel):
+    """Модель ответа со списком сохраненных постов"""
+    posts: List[StoredPostResponse] = Field(..., description="Сохраненные посты")
+    total: int = Field(..., description="Количество постов")
+
 class HealthCheckResponse(BaseModel):
     """Модель ответа для проверки здоровья сервиса"""
     status: str = Field(..., description="Общий статус сервиса")
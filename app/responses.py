@@ -0,0 +1,56 @@
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def make_etag(body: bytes) -> str:
+    """
+    Вычисление ETag по телу ответа
+
+    ETag слабый, так как одно и то же представление может отдаваться
+    в разных кодировках сжатия.
+    """
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Слабое сравнение ETag с заголовком If-None-Match"""
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque_tag = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        if candidate.strip().removeprefix("W/") == opaque_tag:
+            return True
+    return False
+
+
+def conditional_response(request: Request, content: Any) -> Response:
+    """
+    Формирование JSON-ответа с поддержкой ETag/If-None-Match
+
+    Args:
+        request: Входящий запрос
+        content: Данные ответа (pydantic-модель или JSON-совместимый объект)
+
+    Returns:
+        Response: JSON-ответ с ETag или 304 Not Modified
+    """
+    # orjson сериализует datetime и вложенные словари сам, поэтому
+    # модель достаточно привести к словарю без jsonable_encoder
+    if isinstance(content, BaseModel):
+        content = content.model_dump()
+
+    response = ORJSONResponse(content=content)
+    etag = make_etag(response.body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return response
@@ -2,6 +2,7 @@ import logging
 from typing import List, Dict, Any
 from datetime import datetime
 import openai
+from openai import OpenAI
 from fastapi import HTTPException, status
 
 from app.models.schemas import GeneratedPostResponse
@@ -12,9 +13,24 @@ logger = logging.getLogger(__name__)
 class OpenAIContentGenerator:
     """Класс для генерации контента через OpenAI API"""
 
-    def __init__(self, api_key: str):
+    # Количество запросов к API на один пост: заголовок, мета-описание, контент
+    requests_per_post = 3
+
+    def __init__(self, api_key: str, total_timeout: float = 60.0, max_retries: int = 1):
+        """
+        Args:
+            api_key: Ключ OpenAI API
+            total_timeout: Предельное время генерации одного поста со всеми повторами;
+                делится поровну между запросами и попытками
+            max_retries: Число повторов каждого запроса
+        """
         self.api_key = api_key
-        openai.api_key = api_key
+        request_timeout = total_timeout / (self.requests_per_post * (max_retries + 1))
+        self.client = OpenAI(
+            api_key=api_key,
+            timeout=request_timeout,
+            max_retries=max_retries
+        ) if api_key else None
         self.available_models = ["gpt-4", "gpt-4-1106-preview", "gpt-3.5-turbo"]
         self.default_model = "gpt-4-1106-preview"
 
@@ -33,6 +49,12 @@ class OpenAIContentGenerator:
         Returns:
             GeneratedPostResponse: Сгенерированный пост с метаданными
         """
+        if not self.client:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="OpenAI API не настроен"
+            )
+
         try:
             # Подготовка контекста из новостей
             news_context = self._prepare_news_context(news_articles)
@@ -58,30 +80,31 @@ class OpenAIContentGenerator:
                 writing_style=writing_style
             )
 
-        except openai.error.AuthenticationError:
+        except openai.AuthenticationError:
             logger.error("Ошибка аутентификации OpenAI API")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверный API ключ OpenAI"
             )
-        except openai.error.RateLimitError:
+        except openai.RateLimitError:
             logger.error("Превышен лимит запросов к OpenAI API")
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Превышен лимит запросов к OpenAI API. Попробуйте позже."
             )
-        except openai.error.APIError as e:
-            logger.error(f"Ошибка OpenAI API: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Ошибка OpenAI API: {str(e)}"
-            )
-        except openai.error.InvalidRequestError as e:
+        except openai.BadRequestError as e:
             logger.error(f"Неверный запрос к OpenAI API: {e}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Неверный запрос: {str(e)}"
             )
+        except openai.APIError as e:
+            # APIError - базовый класс для ошибок выше, поэтому проверяется последним
+            logger.error(f"Ошибка OpenAI API: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Ошибка OpenAI API: {str(e)}"
+            )
         except Exception as e:
             logger.error(f"Неожиданная ошибка при генерации контента: {e}")
             raise HTTPException(
@@ -127,7 +150,7 @@ class OpenAIContentGenerator:
         - На русском языке
         """
 
-        response = openai.ChatCompletion.create(
+        response = self.client.chat.completions.create(
             model=self.default_model,
             messages=[
                 {
@@ -158,7 +181,7 @@ class OpenAIContentGenerator:
         - На русском языке
         """
 
-        response = openai.ChatCompletion.create(
+        response = self.client.chat.completions.create(
             model=self.default_model,
             messages=[
                 {
@@ -205,7 +228,7 @@ class OpenAIContentGenerator:
         Статья должна быть полезной, информативной и интересной для чтения.
         """
 
-        response = openai.ChatCompletion.create(
+        response = self.client.chat.completions.create(
             model=self.default_model,
             messages=[
                 {
@@ -224,8 +247,10 @@ class OpenAIContentGenerator:
 
     def check_health(self) -> bool:
         """Проверка работоспособности OpenAI API"""
+        if not self.client:
+            return False
         try:
-            openai.Model.list(limit=1)
+            self.client.models.list()
             return True
         except:
             return False
\ No newline at end of file
@@ -0,0 +1,49 @@
+import logging
+import uuid
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional
+
+from app.models.schemas import GeneratedPostResponse, StoredPostResponse
+
+logger = logging.getLogger(__name__)
+
+
+class PostStorage:
+    """Класс для хранения сгенерированных постов в памяти"""
+
+    def __init__(self, max_posts: int = 100):
+        self.max_posts = max_posts
+        self._posts: "OrderedDict[str, StoredPostResponse]" = OrderedDict()
+        self._lock = Lock()
+
+    def add_post(self, post: GeneratedPostResponse) -> StoredPostResponse:
+        """
+        Сохранение поста с присвоением идентификатора
+
+        Args:
+            post: Сгенерированный пост
+
+        Returns:
+            StoredPostResponse: Сохраненный пост с идентификатором
+        """
+        stored = StoredPostResponse(post_id=uuid.uuid4().hex, **post.model_dump())
+
+        with self._lock:
+            self._posts[stored.post_id] = stored
+            # Самые старые посты вытесняются при превышении лимита
+            while len(self._posts) > self.max_posts:
+                self._posts.popitem(last=False)
+
+        logger.info(f"Пост сохранен: {stored.post_id}")
+        return stored
+
+    def get_post(self, post_id: str) -> Optional[StoredPostResponse]:
+        """Получение поста по идентификатору"""
+        with self._lock:
+            return self._posts.get(post_id)
+
+    def list_posts(self) -> List[StoredPostResponse]:
+        """Получение списка постов, начиная с самых новых"""
+        with self._lock:
+            return list(reversed(self._posts.values()))
@@ -0,0 +1,323 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app import middleware
+from app.middleware import AdmissionController, AdmissionControlMiddleware, AdmissionRejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_client(controller, gate=None, api_keys=(), trusted_proxy_hops=0):
+    """Клиент к заглушке генерации, которая ждет gate перед ответом"""
+
+    async def generate(request):
+        if gate is not None:
+            await gate.wait()
+        status_code = int(request.query_params.get("status", 200))
+        return JSONResponse({"ok": status_code < 400}, status_code=status_code)
+
+    stub = Starlette(routes=[
+        Route("/generate-post", generate, methods=["POST"]),
+        Route("/generate-posts", generate, methods=["POST"]),
+    ])
+    app = AdmissionControlMiddleware(stub, controller=controller, api_keys=api_keys,
+                                     trusted_proxy_hops=trusted_proxy_hops)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def wait_for_queue(controller, queued):
+    for _ in range(100):
+        if controller.get_stats()["queued"] == queued:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"queue length did not reach {queued}")
+
+
+def test_concurrency_limit_hands_slot_to_queued_request():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, latency_target=60, queue_timeout=60)
+        gate = asyncio.Event()
+        async with make_client(controller, gate) as client:
+            requests = [asyncio.create_task(client.post("/generate-post")) for _ in range(2)]
+            await wait_for_queue(controller, 1)
+            assert controller.get_stats()["in_flight"] == 1
+
+            gate.set()
+            responses = await asyncio.gather(*requests)
+
+        assert [r.status_code for r in responses] == [200, 200]
+        stats = controller.get_stats()
+        assert stats["in_flight"] == 0 and stats["queued"] == 0
+        assert stats["admitted"] == 2 and stats["completed"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, latency_target=60,
+                                         queue_timeout=60, initial_service_time=2.5)
+        gate = asyncio.Event()
+        async with make_client(controller, gate) as client:
+            requests = [asyncio.create_task(client.post("/generate-post")) for _ in range(2)]
+            await wait_for_queue(controller, 1)
+
+            rejected = await client.post("/generate-post")
+            gate.set()
+            await asyncio.gather(*requests)
+
+        assert rejected.status_code == 503
+        # Оценка: (1 в очереди + 1) / 1 слот * 2.5 с -> округление вверх
+        assert rejected.headers["Retry-After"] == "5"
+        assert controller.get_stats()["rejected_overload"] == 1
+        assert controller.is_overloaded()
+
+    asyncio.run(scenario())
+
+
+def test_estimated_wait_over_queue_timeout_is_shed_early():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=10, latency_target=60,
+                                         queue_timeout=1, initial_service_time=5)
+        gate = asyncio.Event()
+        async with make_client(controller, gate) as client:
+            first = asyncio.create_task(client.post("/generate-post"))
+            await asyncio.sleep(0.05)
+
+            rejected = await client.post("/generate-post")
+            gate.set()
+            await first
+
+        assert rejected.status_code == 503
+        assert controller.get_stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"max_concurrent": 0},
+    {"max_queue": -1},
+    {"queue_timeout": 0},
+    {"latency_target": 0},
+    {"client_rate": 0},
+    {"client_burst": 0},
+])
+def test_invalid_settings_fail_fast(kwargs):
+    with pytest.raises(ValueError):
+        AdmissionController(**kwargs)
+
+
+def test_idle_controller_without_queue_is_not_overloaded():
+    controller = AdmissionController(max_queue=0)
+
+    assert not controller.is_overloaded()
+    assert controller.get_stats()["overloaded"] is False
+
+
+def test_queue_deadline_returns_503_and_frees_queue():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, latency_target=60,
+                                         queue_timeout=0.1, initial_service_time=0.01)
+        gate = asyncio.Event()
+        async with make_client(controller, gate) as client:
+            first = asyncio.create_task(client.post("/generate-post"))
+            await asyncio.sleep(0.05)
+
+            timed_out = await client.post("/generate-post")
+            gate.set()
+            await first
+
+        assert timed_out.status_code == 503
+        assert "Retry-After" in timed_out.headers
+        stats = controller.get_stats()
+        assert stats["queue_timeouts"] == 1
+        assert stats["queued"] == 0 and stats["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, latency_target=60, queue_timeout=60)
+        await controller.acquire()
+
+        waiter = asyncio.create_task(controller.acquire())
+        await wait_for_queue(controller, 1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert controller.get_stats()["queued"] == 0
+        controller.release()
+        assert controller.get_stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancel_after_handoff_returns_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, latency_target=60, queue_timeout=60)
+        await controller.acquire()
+
+        waiter = asyncio.create_task(controller.acquire())
+        await wait_for_queue(controller, 1)
+        # Слот передан ожидающему, но клиент отключился до его использования
+        controller.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        stats = controller.get_stats()
+        assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_limits_and_refills(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(middleware.time, "monotonic", clock)
+    controller = AdmissionController(client_rate=0.5, client_burst=2)
+
+    controller.check_quota("ip:1")
+    controller.check_quota("ip:1")
+    with pytest.raises(AdmissionRejected) as exc_info:
+        controller.check_quota("ip:1")
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.retry_after == pytest.approx(2.0)
+
+    # Другой клиент не затронут
+    controller.check_quota("ip:2")
+
+    clock.now += 2.0
+    controller.check_quota("ip:1")
+    with pytest.raises(AdmissionRejected):
+        controller.check_quota("ip:1")
+
+
+def test_tracked_clients_are_bounded():
+    controller = AdmissionController()
+    controller.max_tracked_clients = 3
+
+    for client_id in ("a", "b", "c", "a", "d"):
+        controller.check_quota(client_id)
+
+    assert list(controller._buckets) == ["c", "a", "d"]
+
+
+def test_quota_rejection_has_retry_after():
+    async def scenario():
+        controller = AdmissionController(client_rate=0.1, client_burst=1)
+        async with make_client(controller) as client:
+            first = await client.post("/generate-post")
+            second = await client.post("/generate-post")
+
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert second.headers["Retry-After"] == "10"
+        assert controller.get_stats()["rejected_quota"] == 1
+        assert not controller.is_overloaded()
+
+    asyncio.run(scenario())
+
+
+def test_unknown_api_keys_share_ip_bucket():
+    async def scenario():
+        controller = AdmissionController(client_rate=0.01, client_burst=1)
+        async with make_client(controller, api_keys=["known"]) as client:
+            first = await client.post("/generate-post", headers={"X-API-Key": "random-1"})
+            second = await client.post("/generate-post", headers={"X-API-Key": "random-2"})
+            known = await client.post("/generate-post", headers={"X-API-Key": "known"})
+
+        assert [first.status_code, second.status_code, known.status_code] == [200, 429, 200]
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("trusted_proxy_hops", [0, 1])
+def test_spoofed_forwarded_for_shares_bucket(trusted_proxy_hops):
+    async def scenario():
+        controller = AdmissionController(client_rate=0.01, client_burst=1)
+        async with make_client(controller, trusted_proxy_hops=trusted_proxy_hops) as client:
+            # Прокси дописывает реальный адрес клиента последней записью
+            return [
+                (await client.post("/generate-post",
+                                   headers={"X-Forwarded-For": f"10.0.0.{i}, 9.9.9.9"})).status_code
+                for i in range(5)
+            ]
+
+    assert asyncio.run(scenario()) == [200, 429, 429, 429, 429]
+
+
+def test_forwarded_for_hop_identifies_client():
+    async def scenario():
+        controller = AdmissionController(client_rate=0.01, client_burst=1)
+        async with make_client(controller, trusted_proxy_hops=2) as client:
+            first = await client.post("/generate-post", headers={"X-Forwarded-For": "1.1.1.1, 9.9.9.9, 10.0.0.1"})
+            other = await client.post("/generate-post", headers={"X-Forwarded-For": "8.8.8.8, 10.0.0.1"})
+            same = await client.post("/generate-post", headers={"X-Forwarded-For": "6.6.6.6, 9.9.9.9, 10.0.0.1"})
+            # Меньше записей, чем доверенных прокси: запрос пришел в обход них
+            direct = await client.post("/generate-post", headers={"X-Forwarded-For": "7.7.7.7"})
+
+        assert [first.status_code, other.status_code, same.status_code] == [200, 200, 429]
+        assert direct.status_code == 200
+        assert set(controller._buckets) == {"ip:9.9.9.9", "ip:8.8.8.8", "ip:127.0.0.1"}
+
+    asyncio.run(scenario())
+
+
+def test_overload_rejection_refunds_quota():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=0, client_rate=0.01, client_burst=2)
+        gate = asyncio.Event()
+        async with make_client(controller, gate) as client:
+            first = asyncio.create_task(client.post("/generate-post"))
+            await asyncio.sleep(0.05)
+
+            shed = await client.post("/generate-post")
+            gate.set()
+            await first
+            retried = await client.post("/generate-post")
+
+        assert shed.status_code == 503
+        assert retried.status_code == 200
+
+    asyncio.run(scenario())
+
+
+def test_failed_responses_do_not_update_service_time():
+    async def scenario():
+        controller = AdmissionController(initial_service_time=15.0)
+        async with make_client(controller) as client:
+            response = await client.post("/generate-post", params={"status": 500})
+
+        assert response.status_code == 500
+        stats = controller.get_stats()
+        assert stats["avg_service_time"] == 15.0
+        assert stats["failed"] == 1 and stats["completed"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_only_exact_post_path_is_controlled():
+    async def scenario():
+        controller = AdmissionController(client_rate=0.01, client_burst=1)
+        async with make_client(controller) as client:
+            other_path = await client.post("/generate-posts")
+            wrong_method = await client.get("/generate-post")
+
+        assert other_path.status_code == 200
+        assert wrong_method.status_code == 405
+        assert controller.get_stats()["admitted"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,235 @@
+import asyncio
+import gzip
+from datetime import datetime
+
+import brotli
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.routing import Route
+
+from app import main
+from app.middleware import CompressionMiddleware
+from app.models.schemas import GeneratedPostResponse
+from app.responses import etag_matches, make_etag
+from app.services.post_storage import PostStorage
+
+
+@pytest.fixture
+def compression():
+    return CompressionMiddleware(app=None)
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("br", "br"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br; q=0.9, gzip;q=0.8", "br"),
+    ("GZIP", "gzip"),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("gzip;q=abc, br;q=0", None),
+    ("deflate, gzip;q=0.1", "gzip"),
+])
+def test_select_encoding(compression, accept_encoding, expected):
+    assert compression.select_encoding(accept_encoding) == expected
+
+
+def test_make_etag_is_weak_and_content_dependent():
+    etag = make_etag(b'{"a":1}')
+
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag(b'{"a":1}')
+    assert etag != make_etag(b'{"a":2}')
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    ("*", True),
+    (" * ", True),
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"other", W/"abc"', True),
+    ('"other",W/"abc"', True),
+    ('"other"', False),
+    ('"ab"', False),
+    ('abc', False),
+    ('"other", *', False),
+])
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches(if_none_match, 'W/"abc"') is expected
+
+
+BIG_BODY = "текст поста " * 200
+
+
+def make_stub_client(accept_encoding=None):
+    """Клиент к заглушке за CompressionMiddleware"""
+
+    async def big(request):
+        return PlainTextResponse(BIG_BODY)
+
+    async def small(request):
+        return PlainTextResponse("ok")
+
+    async def not_modified(request):
+        return Response(status_code=304, headers={"ETag": 'W/"abc"'})
+
+    async def stream(request):
+        async def chunks():
+            for _ in range(3):
+                yield BIG_BODY.encode()
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    async def varied(request):
+        return PlainTextResponse(BIG_BODY, headers={"Vary": "Accept-Encoding"})
+
+    stub = Starlette(routes=[
+        Route("/big", big),
+        Route("/small", small),
+        Route("/not-modified", not_modified),
+        Route("/stream", stream),
+        Route("/varied", varied),
+    ])
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=CompressionMiddleware(stub, minimum_size=100)),
+        base_url="http://test"
+    )
+    if accept_encoding is None:
+        del client.headers["accept-encoding"]
+    else:
+        client.headers["accept-encoding"] = accept_encoding
+    return client
+
+
+async def fetch(path, accept_encoding=None):
+    async with make_stub_client(accept_encoding) as client:
+        return await client.get(path)
+
+
+@pytest.mark.parametrize("path, accept_encoding", [
+    ("/big", None),
+    ("/big", "identity"),
+    ("/big", "gzip"),
+    ("/small", "br"),
+    ("/not-modified", "gzip"),
+    ("/stream", "gzip"),
+    ("/varied", "br"),
+])
+def test_every_response_varies_on_accept_encoding(path, accept_encoding):
+    response = asyncio.run(fetch(path, accept_encoding))
+
+    assert response.headers.get_list("vary") == ["Accept-Encoding"]
+
+
+@pytest.mark.parametrize("encoding, decompress", [
+    ("gzip", gzip.decompress),
+    ("br", brotli.decompress),
+])
+def test_large_body_is_compressed(encoding, decompress):
+    async def scenario():
+        async with make_stub_client(encoding) as client:
+            async with client.stream("GET", "/big") as response:
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        return response, raw
+
+    response, raw = asyncio.run(scenario())
+
+    assert response.headers["content-encoding"] == encoding
+    assert int(response.headers["content-length"]) == len(raw)
+    assert len(raw) < len(BIG_BODY.encode())
+    assert decompress(raw).decode() == BIG_BODY
+
+
+@pytest.mark.parametrize("path, accept_encoding", [
+    ("/big", None),
+    ("/big", "identity"),
+    ("/small", "gzip"),
+    ("/not-modified", "br"),
+    ("/stream", "gzip"),
+])
+def test_response_is_passed_through_uncompressed(path, accept_encoding):
+    response = asyncio.run(fetch(path, accept_encoding))
+
+    assert "content-encoding" not in response.headers
+    if path == "/stream":
+        assert response.text == BIG_BODY * 3
+    if path == "/not-modified":
+        assert response.status_code == 304 and response.content == b""
+
+
+@pytest.fixture
+def api_client(monkeypatch):
+    monkeypatch.setattr(main, "post_storage", PostStorage(max_posts=10))
+    return TestClient(main.app)
+
+
+def store_post(topic="искусственный интеллект"):
+    return main.post_storage.add_post(GeneratedPostResponse(
+        topic=topic,
+        title="Заголовок",
+        content=BIG_BODY,
+        meta_description="Описание",
+        news_used=[],
+        generated_at=datetime(2024, 1, 1, 12, 0),
+        tokens_used=100,
+        writing_style="professional"
+    ))
+
+
+@pytest.mark.parametrize("path", ["/posts", "/posts/{post_id}"])
+def test_posts_etag_revalidation(api_client, path):
+    post = store_post()
+    url = path.format(post_id=post.post_id)
+
+    response = api_client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "no-cache"
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+
+    not_modified = api_client.get(url, headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    assert not_modified.headers.get_list("vary") == ["Accept-Encoding"]
+
+    # Сравнение слабое: сильная форма того же тега тоже подходит
+    assert api_client.get(url, headers={"If-None-Match": etag[2:]}).status_code == 304
+    assert api_client.get(url, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_post_list_etag_changes_with_content(api_client):
+    store_post()
+    etag = api_client.get("/posts").headers["etag"]
+
+    store_post("другая тема")
+    response = api_client.get("/posts", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json()["total"] == 2
+    assert response.headers["etag"] != etag
+
+
+def test_post_body_round_trips(api_client):
+    post = store_post()
+
+    data = api_client.get(f"/posts/{post.post_id}", headers={"Accept-Encoding": "br"}).json()
+
+    assert data["post_id"] == post.post_id
+    assert data["content"] == BIG_BODY
+    assert data["generated_at"] == "2024-01-01T12:00:00"
+
+
+def test_unknown_post_returns_404(api_client):
+    response = api_client.get("/posts/missing")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Пост не найден"}
+    assert "etag" not in response.headers